@@ -5,9 +5,130 @@ Created on Tue Feb 22 01:21:02 2022
 @author: Andy
 """
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from sklearn.base import clone
 from sklearn.ensemble import IsolationForest
+from joblib import Parallel, delayed, parallel_backend, cpu_count
+
+# Every model uses the same settings, so each function clones this unfitted template instead of building and validating a new isolation forest.
+# max_samples = "auto" grows each tree on min(256, number of rows), so the fit cost doesn't grow with longer series.
+_IF_TEMPLATE = IsolationForest(n_estimators = 100, max_samples = "auto", contamination = "auto", bootstrap = False, n_jobs = -1, random_state=42)
+
+
+def _rolling_means(x, windowList):
+    """
+    Rolling means of x for each of the window sizes, one column per window in the same order as windowList.
+    Every window is taken from the same cumulative sum so the data is only read once no matter how many windows there are.
+    The first w - 1 values of each column are nan to match the pandas rolling mean, and so is every window that has a nan in it.
+    """
+    # A nan would carry through the cumulative sum into every later window, so the missing values are summed as 0 and counted separately.
+    # Only the windows with a missing value in them are set to nan afterwards, the same as the pandas rolling mean.
+    missing = ~np.isfinite(x)
+    # The differences of a cumulative sum lose precision when the values are large and the sum keeps growing, so the mean is taken out before summing and added back to every window.
+    offset = x[~missing].mean() if not missing.all() else 0.0
+    csum = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, x - offset))))
+    anyMissing = missing.any()
+    if anyMissing:
+        cmissing = np.concatenate(([0], np.cumsum(missing)))
+    # Fortran order keeps each window's column contiguous so taking the slice for one window reads a single block of memory.
+    out = np.full((x.shape[0], len(windowList)), np.nan, order = 'F')
+    for i, w in enumerate(windowList):
+        out[w - 1:, i] = (csum[w:] - csum[:-w]) / w + offset
+        if anyMissing:
+            out[w - 1:, i][cmissing[w:] != cmissing[:-w]] = np.nan
+    return out
+
+
+def _rolling_frame(dataArr, timeCol, windowList):
+    """
+    The rolling means for each of the window sizes as a dataframe indexed by the time element, one column per window.
+    """
+    return pd.DataFrame(_rolling_means(dataArr, windowList), index = timeCol, columns = windowList)
+
+
+def _score(template, X, n_jobs = -1):
+    """
+    Fits a clone of the template isolation forest to X and scores X with it.
+    The anomaly is taken from the sign of the scores the same way predict does it, predict would score every tree again.
+    Returns the scores as float32 and the anomaly as int8, -1 for an anomaly and 1 for non-anomalous. The anomaly is taken from the scores before they are narrowed.
+    n_jobs is the number of threads for the trees, -1 uses every core.
+    """
+    # n_jobs is set on the clone as well, the forest's own n_jobs would override the one from parallel_backend.
+    clf = clone(template).set_params(n_jobs = n_jobs)
+    
+    # The isolation forest converts its inputs to float32 on every fit and score, so X is converted once here to skip those copies.
+    X = np.asarray(X, dtype = np.float32)
+    
+    # When every feature is constant the trees can't split, so every row scores 0 (sklearn can land a rounding error below 0 and flag every row). A score of 0 with no anomalies is returned without fitting the trees.
+    if X.size == 0 or not np.ptp(X, axis = 0).any():
+        return np.zeros(X.shape[0], dtype = np.float32), np.ones(X.shape[0], dtype = np.int8)
+    
+    # The trees are fitted and scored on threads, the threading backend is what makes the scoring run in parallel as well.
+    with parallel_backend("threading", n_jobs = n_jobs):
+        clf.fit(X)
+        scores = clf.decision_function(X)
+    
+    anomaly = np.where(scores < 0, -1, 1).astype(np.int8)
+    return scores.astype(np.float32), anomaly
+
+
+def _delta(dataArr):
+    """
+    The difference of each value from the prior measurement, the first value is nan since there isn't a prior measurement.
+    Used by both getBaseDelta and getWindowsDelta so the delta is always calculated the same way.
+    """
+    deltaArr = np.empty(dataArr.shape[0], dtype = np.float64)
+    deltaArr[:1] = np.nan
+    np.subtract(dataArr[1:], dataArr[:-1], out = deltaArr[1:])
+    return deltaArr
+
+
+def _anomaly_frame(dfResults, i):
+    """
+    The anomaly column of the i-th model in a results dataframe, renamed to Anomaly so it can be passed to getPlot.
+    Each model in the results has 3 columns and the anomaly is the second of them, the position is used since the names can repeat if a window size is listed twice.
+    """
+    return dfResults.iloc[:, [3*i + 1]].set_axis(['Anomaly'], axis = 1)
+
+
+def _pad(dfResults, n):
+    """
+    The columns of a results dataframe padded with nan values at the top to n rows, the models drop the rows with nan values from the top so their results are always the last rows of the input.
+    The anomaly columns are padded as nullable Int8 so they stay 1 byte per row, padding them with nan would turn them into float64.
+    Returns a dataframe with a RangeIndex, the time column is assigned once after all of the results are put together.
+    """
+    dropped = n - len(dfResults)
+    if dropped == 0:
+        return dfResults.reset_index(drop = True)
+    
+    columns = []
+    for j in range(dfResults.shape[1]):
+        column = dfResults.iloc[:, j]
+        if str(column.dtype) in ('int8', 'Int8'):
+            values = pd.array(column, dtype = 'Int8')
+            data = np.ones(n, dtype = np.int8)
+            data[dropped:] = values.to_numpy(dtype = np.int8, na_value = 1)
+            mask = np.ones(n, dtype = bool)
+            mask[dropped:] = values.isna()
+            padded = pd.arrays.IntegerArray(data, mask)
+        else:
+            values = column.to_numpy()
+            padded = np.full(n, np.nan, dtype = np.result_type(values.dtype, np.float32))
+            padded[dropped:] = values
+        columns.append(padded)
+    return pd.DataFrame(dict(enumerate(columns)), index = pd.RangeIndex(n)).set_axis(dfResults.columns, axis = 1)
+
+
+def _combine(frames, timeCol):
+    """
+    Puts the results of the models side by side by position and then assigns the time column as the index once.
+    Lining the results up by the time labels instead would fail on repeated timestamps and would sort a time column that isn't in order.
+    """
+    combined = pd.concat([_pad(dfResults, len(timeCol)) for dfResults in frames], axis = 1)
+    combined.index = timeCol
+    return combined
 
 
 def getPlot(dataCol, timeCol, dfResults, title, xx = None, yy = None):
@@ -21,7 +142,7 @@ def getPlot(dataCol, timeCol, dfResults, title, xx = None, yy = None):
     timeCol : Either a datetime column or a datetimeindex
         The time element pair with the data
     dfResults : Pandas dataframe
-        The dataframe passed by other functions that contains the isolation forest results
+        The dataframe passed by other functions that contains the isolation forest results, only its Anomaly column is used. The rows line up with the last rows of dataCol and timeCol, since the models drop the rows with nan values from the top.
     title : String
         The pre-set title for each of the plots to describe which features were used in the model. 
     xx : String, optional
@@ -36,19 +157,24 @@ def getPlot(dataCol, timeCol, dfResults, title, xx = None, yy = None):
     """
     fig, ax = plt.subplots(figsize=(10,6))
     
-    # Selects the data from the results dataframe that's flagged as anomalous.
-    a = dfResults.loc[dfResults['Anomaly'] == -1, ['Date', 'Incidents']] #anomaly
+    # Selects the data that's flagged as anomalous, a boolean mask on the arrays skips building a new dataframe with loc.
+    # The results can be shorter than the input data, so the mask is lined up with the end of the data and time arrays.
+    # The padded rows of a nullable Int8 anomaly column are read as nan so they aren't plotted as anomalies.
+    mask = dfResults['Anomaly'].to_numpy(dtype = np.float32, na_value = np.nan) == -1 #anomaly
+    dropped = len(dataCol) - len(mask)
+    dates = np.asarray(timeCol)[dropped:][mask]
+    incidents = np.asarray(dataCol)[dropped:][mask]
     # Line plot of the base default values.
     ax.plot(timeCol, dataCol, color='C0', label='Normal')
     # Makes a scatter plot in the same frame as the line plot so that each of the anomalous data appears as a red dot.
-    ax.scatter(a['Date'],a['Incidents'], color='red', label='Anomaly')
+    ax.scatter(dates, incidents, color='red', label='Anomaly')
     plt.xlabel(xx)
     plt.ylabel(yy)
     plt.title(title)
     plt.legend()
     plt.show()
 
-def getBase(dataCol, timeCol, xx = None, yy = None, time = None):
+def getBase(dataCol, timeCol, xx = None, yy = None, time = None, plot = True, n_jobs = -1):
     """
     Parameters
     ----------
@@ -62,42 +188,50 @@ def getBase(dataCol, timeCol, xx = None, yy = None, time = None):
         The optional string for the y axis. The default is None.
     time : Boolean, optional
         If set to True the end result dataframe will contain a datetime column. If None the result will contain only the date. The default is None.
+    plot : Boolean, optional
+        If set to False the plot of the results is skipped, this saves the time of drawing the figure when only the results are needed. The default is True.
+    n_jobs : Int, optional
+        The number of threads used to fit and score the trees of each model, -1 uses every core. The default is -1.
 
     Returns
     -------
     A dataframe of the output of the isolation forest fitted to the base values and a plot of the results.
 
     """
-    clf=IsolationForest(random_state=42)
-    
-    clf.fit(dataCol.to_numpy().reshape(-1,1))
+    dataArr = np.asarray(dataCol)
+    scores, anomaly = _score(_IF_TEMPLATE, dataArr.reshape(-1,1), n_jobs = n_jobs)
     
     # Creating the DF with the results:
     #   Scores is the decimal scoring system that isolation forest uses
     #   The anomaly column is to simplify looking up values that are anomalous or not
     #   The default return values for anomaly are -1 for an anomaly and 1 for non-anomalous
+    #   The anomaly is stored as int8 and the scores as float32 to keep the results small
     
-    dfResults = pd.DataFrame()
-    dfResults['baseScores']=clf.decision_function(dataCol.to_numpy().reshape(-1,1))
-    dfResults['Anomaly']=clf.predict(dataCol.to_numpy().reshape(-1,1))
-    dfResults['Incidents'] = dataCol.values
+    # The results are indexed by the time element so that getIF can line up every model's output on the same dates.
+    dfResults = pd.DataFrame(index = timeCol)
+    dfResults['baseScores']=scores
+    dfResults['Anomaly']=anomaly
+    dfResults['Incidents'] = dataArr
     
     # Doing these two seperately because a datetimeindex can't be converted with dt, so it is turned into a datetime then date.
     # If the data type was only input as a column of datetime this wouldn't be required, however this gives the option of using a datetimeindex.
     # time == none is to include only date, time == true is to include the time if its included in the input
     
+    # The Date is taken from the index instead of timeCol, a datetime column would be lined up by its own index labels and come back as NaT.
+    
     if time == None:
-        dfResults['Date'] = timeCol
+        dfResults['Date'] = dfResults.index
         dfResults['Date'] = dfResults['Date'].dt.date
     elif time == True:
-        dfResults['Date'] = timeCol
+        dfResults['Date'] = dfResults.index
 
     
-    getPlot(dataCol, timeCol, dfResults, xx = xx, yy = yy, title = "Raw Input")
+    if plot:
+        getPlot(dataArr, timeCol, dfResults, xx = xx, yy = yy, title = "Raw Input")
     
     return(dfResults)
 
-def getBaseDelta(dataCol, timeCol, xx = None, yy = None):
+def getBaseDelta(dataCol, timeCol, xx = None, yy = None, plot = True, n_jobs = -1, deltaArr = None):
     """
     Parameters
     ----------
@@ -109,40 +243,46 @@ def getBaseDelta(dataCol, timeCol, xx = None, yy = None):
         The optional string for the x axis. The default is None.
     yy : String, optional
         The optional string for the y axis. The default is None.
+    plot : Boolean, optional
+        If set to False the plot of the results is skipped, this saves the time of drawing the figure when only the results are needed. The default is True.
+    n_jobs : Int, optional
+        The number of threads used to fit and score the trees of each model, -1 uses every core. The default is -1.
+    deltaArr : Numpy array, optional
+        The difference of each value from the prior measurement with nan for the first value, getIF calculates it once for both of the delta models. If None it is calculated from dataCol. The default is None.
 
     Returns
     -------
     A dataframe of the output of the isolation forest fitted to both the base value and a value for the difference from the prior measurement, also returns a plot of the results.
 
     """
-    clf=IsolationForest(random_state=42)
+    # The difference from the prior measurement doesn't exist for the first row, so the features start from the second row.
+    # The delta and the base values are written straight into the float32 feature array instead of building and dropping na from a dataframe.
     
-    deltaCol = dataCol.diff()
-    deltaPD = pd.concat([deltaCol,dataCol], axis = 1)
-    deltaPD.columns = ("deltaCol", "dataCol")   
-    deltaPD = deltaPD.dropna()
+    dataArr = np.asarray(dataCol, dtype = np.float64)
+    if deltaArr is None:
+        deltaArr = _delta(dataArr)
+    deltaArr = deltaArr[1:]
+    deltaPD = np.empty((deltaArr.shape[0], 2), dtype = np.float32)
+    deltaPD[:,0] = deltaArr
+    deltaPD[:,1] = dataArr[1:]
 
-    clf.fit(deltaPD)
-    dfResults = pd.DataFrame()
-    dfResults['deltaScores']=clf.decision_function(deltaPD)
-    dfResults['Anomaly']=clf.predict(deltaPD)
+    scores, anomaly = _score(_IF_TEMPLATE, deltaPD, n_jobs = n_jobs)
     
-    # When using the difference between rows it will create an na value for the first row, below is making the length of the arrays match.
+    dfResults = pd.DataFrame(index = timeCol[1:])
+    dfResults['deltaScores']=scores
+    dfResults['Anomaly']=anomaly
     
-    dfResults['Incidents'] = dataCol[1:].values
-    dfResults['deltaIncidents'] = deltaCol[1:].values 
-    dfResults['Date'] = timeCol[1:]
+    dfResults['deltaIncidents'] = deltaArr
 
-    getPlot(dataCol, timeCol, dfResults, xx = xx, yy = yy, title = "Raw Input and Delta")
+    if plot:
+        getPlot(dataArr, timeCol, dfResults, xx = xx, yy = yy, title = "Raw Input and Delta")
     
-    # Dropping the date so that the DF of the output only 1 date will be present, using the date column from the initial model for that.
-    dfResults = dfResults.drop('Date', 1)
-    dfResults = dfResults.drop('Incidents', 1)
-    dfResults.columns.values[1] = "deltaAnomaly"
+    # The date and the base values aren't added so that the DF of the output only has them once, using the columns from the initial model for that.
+    dfResults.columns = ['deltaScores', 'deltaAnomaly', 'deltaIncidents']
     return(dfResults)
 
 
-def getWindows(dataCol, timeCol, windowList, xx = None, yy = None):
+def getWindows(dataCol, timeCol, windowList, xx = None, yy = None, plot = True, n_jobs = -1, rollingDF = None):
     """
     Parameters
     ----------
@@ -156,6 +296,12 @@ def getWindows(dataCol, timeCol, windowList, xx = None, yy = None):
         The optional string for the x axis. The default is None.
     yy : String, optional
         The optional string for the y axis. The default is None.
+    plot : Boolean, optional
+        If set to False the plot of the results is skipped, this saves the time of drawing the figure when only the results are needed. The default is True.
+    n_jobs : Int, optional
+        The number of threads used to fit and score the trees of each model, -1 uses every core. The default is -1.
+    rollingDF : Pandas dataframe, optional
+        The rolling window values for each of the window sizes, getIF calculates them once for both of the window models. If None they are calculated from dataCol. The default is None.
 
     Returns
     -------
@@ -163,40 +309,45 @@ def getWindows(dataCol, timeCol, windowList, xx = None, yy = None):
     A dataframe of the rolling window values to be used in the getWindowsDelta function.
 
     """
-    clf=IsolationForest(random_state=42)
+    if not windowList:
+        return pd.DataFrame(), pd.DataFrame()
     
     # windowresults is used for named columns in the returned endresults, while rollingdf is used for the isolation forest with the delta in the next function.
     
-    rollingDF = pd.DataFrame()
-    windowResults = pd.DataFrame()
+    # The arrays are bound once so every plot in the loop reuses them instead of converting the columns again.
     
-    for val in windowList:
-        rollingCol = dataCol.rolling(val).mean()
-        dropped = rollingCol.isna().sum()
-        rollingCol = rollingCol.dropna()
-        
-        clf.fit(rollingCol.to_numpy().reshape(-1,1))
+    dataArr = np.asarray(dataCol, dtype = np.float64)
+    timeArr = np.asarray(timeCol)
     
+    # Each column of rollingMeans holds the rolling mean for one of the window sizes.
+    if rollingDF is None:
+        rollingDF = _rolling_frame(dataArr, timeCol, windowList)
+    rollingMeans = rollingDF.to_numpy()
+    # The results for each window are collected in a list and put together once at the end so the earlier columns aren't copied again on every loop.
+    # Every window drops a different number of rows from the top, so each one is padded back to the length of the time column.
+    windowResults = []
+    
+    for i, val in enumerate(windowList):
+        # The first val - 1 rolling means are nan, those are left out instead of using dropna.
+        dropped = val - 1
+        scores, anomaly = _score(_IF_TEMPLATE, rollingMeans[dropped:,i].reshape(-1,1), n_jobs = n_jobs)
     
         dfResults = pd.DataFrame()
-        dfResults['scores']=clf.decision_function(rollingCol.to_numpy().reshape(-1,1))
-        dfResults['Anomaly']=clf.predict(rollingCol.to_numpy().reshape(-1,1))
-        dfResults['windowIncidents'] = rollingCol.values
-        dfResults['Incidents'] = dataCol[dropped:].values
-        dfResults['Date'] = timeCol[dropped:]
-        
-        getPlot(dataCol, timeCol, dfResults, xx = xx, yy = yy, title = ('Window of ' + str(val)))
+        dfResults['scores']=scores
+        dfResults['Anomaly']=anomaly
+        dfResults['windowIncidents'] = rollingMeans[dropped:,i]
         
-        dfResults = dfResults.drop('Date', 1)
-        dfResults = dfResults.drop('Incidents', 1)
-        rollingDF = pd.concat([rollingDF,rollingCol], axis=1)
+        if plot:
+            getPlot(dataArr, timeArr, dfResults, xx = xx, yy = yy, title = ('Window of ' + str(val)))
         
         dfResults.columns = ['window'+str(val)+'Scores', 'window'+str(val)+'Anomaly','window'+str(val)+'Incidents']
-        windowResults = pd.concat([windowResults,dfResults],axis=1)
+        windowResults.append(dfResults)
+    
+    windowResults = _combine(windowResults, timeCol)
         
     return rollingDF, windowResults
 
-def getWindowsDelta(dataCol, timeCol, windowList, rollingDF, xx = None, yy = None):
+def getWindowsDelta(dataCol, timeCol, windowList, rollingDF = None, xx = None, yy = None, plot = True, n_jobs = -1, deltaArr = None):
     """
     
 
@@ -208,69 +359,86 @@ def getWindowsDelta(dataCol, timeCol, windowList, rollingDF, xx = None, yy = Non
         The time element pair with the data
     windowList : List of ints
         The size of the rolling window averages to model.
-    rollingDF : Pandas dataframe
-        A column for the values of each of the rolling windows calculated from the dataCol in the getWindows function.
+    rollingDF : Pandas dataframe, optional
+        A column for the values of each of the rolling windows calculated from the dataCol in the getWindows function. If None the rolling means are calculated from dataCol. The default is None.
     xx : String, optional
         The optional string for the x axis. The default is None.
     yy : String, optional
         The optional string for the y axis. The default is None.
+    plot : Boolean, optional
+        If set to False the plot of the results is skipped, this saves the time of drawing the figure when only the results are needed. The default is True.
+    n_jobs : Int, optional
+        The number of threads used to fit and score the trees of each model, -1 uses every core. The default is -1.
+    deltaArr : Numpy array, optional
+        The difference of each value from the prior measurement with nan for the first value, getIF calculates it once for both of the delta models. If None it is calculated from dataCol. The default is None.
 
     Returns
     -------
     A dataframe of the output(s) of the isolation forest fitted to the selected rolling window sizes and a value for the difference from the prior measurement, also returns a plot of the results.
 
     """
+    if not windowList:
+        return pd.DataFrame()
+    
+    windowDeltaResults = []
     
-    clf=IsolationForest(random_state=42)
+    # The delta column is the same for every window size so it is only calculated once.
+    # Each model is fitted on the delta combined with the rolling mean for its window, the rolling mean is what changes between the window sizes.
     
-    windowDeltaResults = pd.DataFrame()
+    # windowList is used in this function during the plotting, the arrays are bound once so every plot in the loop reuses them
     
-    # windowList is used in this function during the plotting
+    dataArr = np.asarray(dataCol, dtype = np.float64)
+    timeArr = np.asarray(timeCol)
+    if deltaArr is None:
+        deltaArr = _delta(dataArr)
     
-    for val, (columnName, columnData) in zip(windowList,rollingDF.iloc[:,:].iteritems()):
-        deltaCol = dataCol.diff()
-        deltaPD = pd.concat([deltaCol,dataCol], axis = 1)
-        deltaPD.columns = ("deltaCol", "dataCol")
-        dropped = deltaPD['deltaCol'].isna().sum()
-        deltaPD = deltaPD.dropna()
+    # The rolling means are read straight from the numpy array, iterating over the dataframe columns would create a series for each of them.
+    if rollingDF is None:
+        rollingDF = _rolling_frame(dataArr, timeCol, windowList)
+    rollingMeans = rollingDF.to_numpy()
+    
+    for i, val in enumerate(windowList):
+        # The delta has one nan value at the top and the rolling mean has val - 1, so the larger of the two is dropped.
+        dropped = max(1, val - 1)
+        deltaPD = np.column_stack((deltaArr[dropped:], rollingMeans[dropped:,i]))
         
-        clf.fit(deltaPD)
+        scores, anomaly = _score(_IF_TEMPLATE, deltaPD, n_jobs = n_jobs)
         
         dfResults = pd.DataFrame()
-        dfResults['scores']=clf.decision_function(deltaPD)
-        dfResults['Anomaly']=clf.predict(deltaPD)  
-        dfResults['Incidents'] = dataCol[dropped:].values
-        dfResults['deltaIncidents'] = deltaCol[dropped:].values
-        dfResults['Date'] = timeCol[dropped:]
+        dfResults['scores']=scores
+        dfResults['Anomaly']=anomaly
+        dfResults['deltaIncidents'] = deltaArr[dropped:]
         
-
-        getPlot(dataCol, timeCol, dfResults, xx = xx, yy = yy, title = ('Window of ' + str(val) + ' and Delta'))
+        if plot:
+            getPlot(dataArr, timeArr, dfResults, xx = xx, yy = yy, title = ('Window of ' + str(val) + ' and Delta'))
         
-        dfResults = dfResults.drop('Date', 1)
-        dfResults = dfResults.drop('Incidents', 1)
-
         dfResults.columns = ['windowDelta'+str(val)+'Scores', 'windowDelta'+str(val)+'Anomaly','windowDelta'+str(val)+'Incidents']
-        windowDeltaResults = pd.concat([windowDeltaResults,dfResults],axis=1)
+        windowDeltaResults.append(dfResults)
+    
+    windowDeltaResults = _combine(windowDeltaResults, timeCol)
         
     return windowDeltaResults
 
-def getIF(dataCol, timeCol, windowList, x = None, y = None, time = None):
+def getIF(dataCol, timeCol, windowList, x = None, y = None, time = None, plot = True):
     """
     Parameters
     ----------
-   dataCol : Array of int
-        The data to fit to isolation forest and to create features for.
+    dataCol : Array of int
+        The data to fit to isolation forest and to create features for, either a pandas series or a numpy array. Needs at least 2 values for the delta.
     timeCol : Either a datetime column or a datetimeindex
-        The time element pair with the data
+        The time element pair with the data, a datetime64 numpy array also works.
     windowList : List of ints
-        The size of the rolling window averages to model.
+        The size of the rolling window averages to model. None of the windows can be longer than dataCol.
     x : String, optional
         The optional string for the x axis. The default is None.
     y : String, optional
         The optional string for the y axis. The default is None.
     time : Boolean, optional
         If set to True the end result dataframe will contain a datetime column. If None the result will contain only the date. The default is None.
-        
+    plot : Boolean, optional
+        If set to False the plots of the results are skipped, this saves the time of drawing the figures when only the results dataframe is needed. The default is True.
+        For batch runs without a display, setting the MPLBACKEND environment variable to Agg keeps matplotlib from opening any windows.
+
     Returns
     -------
     isoResults : Pandas dataframe
@@ -283,26 +451,70 @@ def getIF(dataCol, timeCol, windowList, x = None, y = None, time = None):
     A plot highlighting the anomalies against the base values for each of the models fitted in the results dataframe.
             
     """
-    assert isinstance(dataCol, pd.core.series.Series), 'dataCol should be a pandas series'
-    assert isinstance(timeCol, pd.core.indexes.datetimes.DatetimeIndex), 'timeCol should be a pandas DatetimeIndex'
-    assert isinstance(windowList, list), 'windowList should be a list'
-    baseDF = getBase(dataCol, timeCol, xx = x, yy = y, time = time)
-    rollingCol, rollingDF = getWindows(dataCol, timeCol, windowList, xx = x, yy = y)
-    baseDeltaDF = getBaseDelta(dataCol, timeCol, xx = x, yy = y)
-    windowDeltaDF = getWindowsDelta(dataCol, timeCol, windowList, rollingCol, xx = x, yy = y)
-    
-    isoResults = pd.concat([baseDF, baseDeltaDF, rollingDF, windowDeltaDF], axis = 1)
-    
-    # When concatenating the dataframes, since they are unequal length, there would be nan values at the bottom of every column except the base values.
-    # The loop below is counting the number of nan values, dropping the nan values, then shifting the column down equal to the number of nan values.
-    # This process would create the nan values at the top, and this is important so all of the values from the various data frames line up with the proper date time.
-    # This step could be avoided by not dropping nan values before fitting the isolation forest, however, the IsolationForest function does not allow nan inputs.
-    
-    for (columnName, columnData) in isoResults.iloc[:,:].iteritems():
-        dropped = columnData.isna().sum()
-        test = columnData.dropna()
-        isoResults[columnName] = test
-        isoResults[columnName] = isoResults[columnName].shift(dropped, axis = 0)
+    # The inputs are checked by what they can do instead of asserting their class, so the checks still run under python -O.
+    # dataCol can also be a numpy array, it is converted once here and the arrays are passed to the models so they aren't converted again.
+    # getBase gets the values the way they were input so the Incidents column keeps their dtype, the other models use the float64 copy.
+    
+    inputArr = np.asarray(dataCol)
+    if inputArr.ndim != 1:
+        raise TypeError('dataCol should be a pandas series or a 1d array')
+    dataArr = inputArr.astype(np.float64, copy = False)
+    # timeCol is made into a DatetimeIndex once, a datetime column or a datetime64 array work the same as the index after this.
+    if not pd.api.types.is_datetime64_any_dtype(timeCol):
+        raise TypeError('timeCol should be a datetime column, a DatetimeIndex or a datetime64 array')
+    timeCol = pd.DatetimeIndex(timeCol)
+    # windowList is made into a list once so generators and tuples work, a string is turned into its characters and fails the int check below.
+    try:
+        windowList = list(windowList)
+    except TypeError:
+        raise TypeError('windowList should be a list of ints, got ' + type(windowList).__name__) from None
+    for val in windowList:
+        if isinstance(val, bool) or not isinstance(val, (int, np.integer)):
+            raise TypeError('windowList should only contain ints, got ' + repr(val))
+        if val < 1:
+            raise ValueError('window sizes should be at least 1, got ' + str(val))
+    
+    # The delta needs at least two measurements and every window needs to fit in the series, otherwise there is nothing to fit the models on.
+    
+    if len(dataArr) < 2:
+        raise ValueError('dataCol needs at least 2 values, got ' + str(len(dataArr)))
+    if len(timeCol) != len(dataArr):
+        raise ValueError('timeCol should be the same length as dataCol')
+    for val in windowList:
+        if val > len(dataArr):
+            raise ValueError('window of ' + str(val) + ' is longer than the ' + str(len(dataArr)) + ' values in dataCol')
+    
+    # The delta and the rolling means are each used by two of the models, so they are calculated once here and passed to both.
+    # With the features built up front the four models don't depend on each other, so they are fitted at the same time on threads on top of each model's own parallel trees.
+    # The plots are drawn after all of the models are fitted since matplotlib isn't thread safe.
+    
+    # There are only 4 of them, so the cores are split between them instead of each model asking for every core and starting cores x cores threads.
+    # joblib's cpu_count is used since it counts the cores this process is allowed to use, the same ones the threads for the trees run on.
+    
+    nOuter = 4
+    nInner = max(1, cpu_count() // nOuter)
+    deltaArr = _delta(dataArr)
+    rollingDF = _rolling_frame(dataArr, timeCol, windowList)
+    baseDF, baseDeltaDF, (_, windowDF), windowDeltaDF = Parallel(n_jobs = nOuter, prefer = 'threads')([
+        delayed(getBase)(inputArr, timeCol, time = time, plot = False, n_jobs = nInner),
+        delayed(getBaseDelta)(dataArr, timeCol, plot = False, n_jobs = nInner, deltaArr = deltaArr),
+        delayed(getWindows)(dataArr, timeCol, windowList, plot = False, n_jobs = nInner, rollingDF = rollingDF),
+        delayed(getWindowsDelta)(dataArr, timeCol, windowList, rollingDF, plot = False, n_jobs = nInner, deltaArr = deltaArr)])
+    
+    isoResults = _combine([baseDF, baseDeltaDF, windowDF, windowDeltaDF], timeCol)
+    
+    # The dataframes are unequal length because the rows with nan values are dropped before fitting, the IsolationForest function does not allow nan inputs.
+    # The results are always the last rows of the input, so they are lined up by position with nan values filled in at the top and timeCol is assigned as the index once.
+    
+    # The plots are in the same order as when each function draws its own.
+    
+    if plot:
+        getPlot(dataArr, timeCol, baseDF, xx = x, yy = y, title = "Raw Input")
+        for i, val in enumerate(windowList):
+            getPlot(dataArr, timeCol, _anomaly_frame(windowDF, i), xx = x, yy = y, title = ('Window of ' + str(val)))
+        getPlot(dataArr, timeCol, _anomaly_frame(baseDeltaDF, 0), xx = x, yy = y, title = "Raw Input and Delta")
+        for i, val in enumerate(windowList):
+            getPlot(dataArr, timeCol, _anomaly_frame(windowDeltaDF, i), xx = x, yy = y, title = ('Window of ' + str(val) + ' and Delta'))
      
     return isoResults
 